@@ -1,4 +1,4 @@
-from pydantic_settings import BaseSettings #type:ignore
+from pydantic_settings import BaseSettings, SettingsConfigDict #type:ignore
 from functools import lru_cache
 from typing import Optional
 import os
@@ -13,6 +13,9 @@ class Settings(BaseSettings):
     MYSQL_USER: str = os.getenv("MYSQL_USER", "root")
     MYSQL_PASSWORD: str = os.getenv("MYSQL_PASSWORD", "")
     MYSQL_DATABASE: str = os.getenv("MYSQL_DATABASE", "regulations_db")
+    # Pool size: roughly 2 x CPU cores + effective disk spindles on the DB host
+    DB_POOL_MIN: int = int(os.getenv("DB_POOL_MIN", "10"))
+    DB_POOL_MAX: int = int(os.getenv("DB_POOL_MAX", "20"))
 
     # API settings
     REGULATIONS_API_URL: str = os.getenv(
@@ -24,16 +27,26 @@ class Settings(BaseSettings):
     # Ollama settings
     OLLAMA_API_URL: str = os.getenv("OLLAMA_API_URL", "http://localhost:11434/api/generate")
     MODEL_NAME: str = os.getenv("MODEL_NAME", "qwen:1b")
+    # Cached LLM answers for repeated questions (TTL in seconds)
+    RESPONSE_CACHE_SIZE: int = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+    RESPONSE_CACHE_TTL: int = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))
 
     # App settings
     APP_HOST: str = os.getenv("APP_HOST", "0.0.0.0")
     APP_PORT: int = int(os.getenv("APP_PORT", "8000"))
     DEBUG: bool = os.getenv("DEBUG", "True").lower() == "true"
+    # Incoming WebSocket messages buffered per connection; each slot can hold
+    # up to ws_max_size (16 MiB) bytes, so raise this with memory in mind
+    WS_MAX_QUEUE: int = int(os.getenv("WS_MAX_QUEUE", "64"))
 
-    class Config:
-        env_file = ".env"
-        extra = "allow"  # Allow extra fields
+    # Immutable: one shared instance is handed out by get_settings()
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        extra="allow",  # Allow extra fields
+        frozen=True
+    )
 
 @lru_cache()
 def get_settings() -> Settings:
+    """Return the process-wide Settings instance."""
     return Settings() 
\ No newline at end of file
@@ -1,15 +1,28 @@
 import aiomysql #type:ignore
+import asyncio
+import orjson #type:ignore
+from pymysql.constants import FIELD_TYPE #type:ignore
+from pymysql.converters import conversions #type:ignore
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator
+from datetime import datetime
+from typing import AsyncGenerator, Optional, Tuple
 from .config import get_settings
 import logging
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
 
+# Decode JSON columns in the driver so rows arrive as Python lists/dicts
+DB_CONVERSIONS = {**conversions, FIELD_TYPE.JSON: orjson.loads}
+
+# Process-wide connection pool, created once by init_pool()
+_POOL = None
+# Serializes pool creation so concurrent first callers share one pool
+_POOL_LOCK = asyncio.Lock()
+
 async def init_db():
     """Initialize the database and create tables if they don't exist."""
-    pool = await get_db_pool()
+    pool = await init_pool()
     async with pool.acquire() as conn:
         async with conn.cursor() as cur:
             # Drop existing documents table
@@ -26,70 +39,134 @@ async def init_db():
                     publication_date DATETIME,
                     abstract TEXT,
                     full_text TEXT,
-                    agencies TEXT,
+                    agencies JSON,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    FULLTEXT KEY doc_search_idx (title, abstract, full_text)
+                    FULLTEXT KEY doc_search_idx (title, abstract, full_text),
+                    KEY idx_docs_created (created_at DESC, id)
                 ) 
             """)
             await conn.commit()
 
-async def get_db_pool():
-    """Get a connection pool to the database."""
-    return await aiomysql.create_pool(
-        host=settings.MYSQL_HOST,
-        port=settings.MYSQL_PORT,
-        user=settings.MYSQL_USER,
-        password=settings.MYSQL_PASSWORD,
-        db=settings.MYSQL_DATABASE,
-        charset='utf8mb4',
-        cursorclass=aiomysql.cursors.DictCursor,
-        autocommit=True
-    )
+async def init_pool() -> aiomysql.Pool:
+    """Create the shared connection pool, or return it if it already exists."""
+    global _POOL
+    if _POOL is not None:
+        return _POOL
+    async with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = await aiomysql.create_pool(
+                host=settings.MYSQL_HOST,
+                port=settings.MYSQL_PORT,
+                user=settings.MYSQL_USER,
+                password=settings.MYSQL_PASSWORD,
+                db=settings.MYSQL_DATABASE,
+                charset='utf8mb4',
+                cursorclass=aiomysql.cursors.DictCursor,
+                conv=DB_CONVERSIONS,
+                autocommit=True,
+                # Connections up to minsize are opened eagerly; set DB_POOL_MIN equal
+                # to DB_POOL_MAX to preallocate the whole pool at startup.
+                minsize=settings.DB_POOL_MIN,
+                maxsize=settings.DB_POOL_MAX,
+                pool_recycle=3600
+            )
+    return _POOL
 
 @asynccontextmanager
 async def get_db() -> AsyncGenerator:
-    """Get a database connection from the pool."""
-    pool = await get_db_pool()
+    """Get a database connection from the shared pool."""
+    pool = await init_pool()
     async with pool.acquire() as conn:
+        # Revive connections the server dropped while they sat idle in the pool
+        await conn.ping(reconnect=True)
         async with conn.cursor() as cur:
             yield cur
 
-async def close_db_connection(pool: aiomysql.Pool):
-    """Close the database connection pool."""
+async def close_db_connection(pool: Optional[aiomysql.Pool] = None):
+    """Close the database connection pool (the shared one by default)."""
+    global _POOL
+    pool = pool if pool is not None else _POOL
+    if pool is None:
+        return
     pool.close()
     await pool.wait_closed()
+    if pool is _POOL:
+        _POOL = None
+
+_RECENT_DOCUMENTS_SQL = """
+    SELECT 
+        {columns}
+    FROM documents 
+    {where}
+    ORDER BY created_at DESC, id
+    LIMIT %s
+"""
+
+_RECENT_DOCUMENTS_COLUMNS = "id, title, document_number, document_type, publication_date, abstract, agencies, created_at"
+# Metadata only: leaves out the TEXT/JSON payload columns
+_RECENT_DOCUMENTS_LIGHT_COLUMNS = "id, title, document_number, document_type, publication_date, created_at"
+# Keyset page: rows strictly after (created_at, id) in idx_docs_created order
+_RECENT_DOCUMENTS_AFTER = "WHERE created_at < %s OR (created_at = %s AND id > %s)"
+
+RECENT_DOCUMENTS_QUERY = _RECENT_DOCUMENTS_SQL.format(columns=_RECENT_DOCUMENTS_COLUMNS, where="")
+RECENT_DOCUMENTS_AFTER_QUERY = _RECENT_DOCUMENTS_SQL.format(
+    columns=_RECENT_DOCUMENTS_COLUMNS, where=_RECENT_DOCUMENTS_AFTER
+)
+RECENT_DOCUMENTS_LIGHT_QUERY = _RECENT_DOCUMENTS_SQL.format(columns=_RECENT_DOCUMENTS_LIGHT_COLUMNS, where="")
+RECENT_DOCUMENTS_LIGHT_AFTER_QUERY = _RECENT_DOCUMENTS_SQL.format(
+    columns=_RECENT_DOCUMENTS_LIGHT_COLUMNS, where=_RECENT_DOCUMENTS_AFTER
+)
 
-async def get_recent_documents(limit: int = 10):
+async def _fetch_recent(query: str, after_query: str, limit: int, before: Optional[Tuple[datetime, str]]):
+    """Run one of the recent-documents queries, optionally from a keyset cursor."""
+    if before:
+        query = after_query
+        params = (before[0], before[0], before[1], limit)
+    else:
+        params = (limit,)
+    async with get_db() as cur:
+        await cur.execute(query, params)
+        return await cur.fetchall()
+
+async def get_recent_documents(limit: int = 10, before: Optional[Tuple[datetime, str]] = None):
     """Get the most recently added documents from the database.
     
     Args:
         limit (int): Maximum number of documents to return. Defaults to 10.
+        before: Optional (created_at, id) of the last document from a previous
+            page. Only documents after it in the listing are returned.
         
     Returns:
         List of dictionaries containing document information sorted by creation date.
     """
-    async with get_db() as cur:
-        await cur.execute("""
-            SELECT 
-                id, title, document_number, document_type, publication_date, abstract, agencies, created_at
-            FROM documents 
-            ORDER BY created_at DESC
-            LIMIT %s
-        """, (limit,))
-        return await cur.fetchall()
+    return await _fetch_recent(RECENT_DOCUMENTS_QUERY, RECENT_DOCUMENTS_AFTER_QUERY, limit, before)
+
+async def get_recent_documents_light(limit: int = 10, before: Optional[Tuple[datetime, str]] = None):
+    """Get metadata for the most recently added documents.
+    
+    Same ordering and paging as `get_recent_documents`, but without the
+    abstract and agencies columns, for listings that only show metadata.
+    
+    Args:
+        limit (int): Maximum number of documents to return. Defaults to 10.
+        before: Optional (created_at, id) keyset cursor from a previous page.
+        
+    Returns:
+        List of dictionaries with id, title, document_number, document_type,
+        publication_date and created_at.
+    """
+    return await _fetch_recent(RECENT_DOCUMENTS_LIGHT_QUERY, RECENT_DOCUMENTS_LIGHT_AFTER_QUERY, limit, before)
 
 async def test_db_connection():
     """Test database connection and count documents."""
     try:
-        pool = await get_db_pool()
-        async with pool.acquire() as conn:
-            async with conn.cursor() as cur:
-                await cur.execute("SELECT COUNT(*) as count FROM documents")
-                result = await cur.fetchone()
-                doc_count = result[0] if result else 0
-                logger.info(f"Successfully connected to database. Found {doc_count} documents.")
-                return True, doc_count
+        async with get_db() as cur:
+            await cur.execute("SELECT COUNT(*) as count FROM documents")
+            result = await cur.fetchone()
+            doc_count = result['count'] if result else 0
+            logger.info(f"Successfully connected to database. Found {doc_count} documents.")
+            return True, doc_count
     except Exception as e:
         logger.error(f"Database connection error: {str(e)}")
         return False, 0 
\ No newline at end of file
@@ -1,11 +1,17 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect #type:ignore
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect #type:ignore
 from fastapi.staticfiles import StaticFiles #type:ignore
-from fastapi.responses import HTMLResponse #type:ignore
+from fastapi.responses import HTMLResponse, Response #type:ignore
+import asyncio
+import hashlib
+import msgspec #type:ignore
 import logging
+import sys
 from pathlib import Path
+from datetime import datetime
 from .core.config import get_settings
 from .services.agent import Agent
-from .core.database import init_db, test_db_connection, get_recent_documents
+from .models.schemas import ChatResponse
+from .core.database import init_db, init_pool, close_db_connection, test_db_connection, get_recent_documents_light
 from typing import Optional
 import uvicorn #type:ignore
 
@@ -19,59 +25,116 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 # Initialize agent
 agent = Agent()
 
+# Upper bound on responses coalesced into a single WebSocket frame
+MAX_WS_BATCH = 32
+# Shared encoder for outgoing WebSocket messages
+ws_encoder = msgspec.json.Encoder()
+
+# Chat page, read once at import and served from memory
+CHAT_HTML = Path("templates/index.html").read_bytes()
+CHAT_HTML_ETAG = f'"{hashlib.md5(CHAT_HTML).hexdigest()}"'
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize and test the database on startup."""
-    # Test database connection
+    await agent.startup()
+
+    # Test database connection. This also creates the shared connection pool;
+    # if the database is unreachable now, get_db() creates it on first use.
     success, doc_count = await test_db_connection()
     if not success:
         logger.error("Failed to connect to database!")
     else:
+        app.state.pool = await init_pool()
         logger.info(f"Database connection successful. Found {doc_count} documents.")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release the HTTP session and database connection pool on shutdown."""
+    await agent.shutdown()
+    await close_db_connection()
+
 @app.get("/", response_class=HTMLResponse)
-async def get_chat_page():
+async def get_chat_page(request: Request):
     """Serve the chat interface."""
-    html_path = Path("templates/index.html")
-    return html_path.read_text()
+    if request.headers.get("if-none-match") == CHAT_HTML_ETAG:
+        return Response(status_code=304, headers={"ETag": CHAT_HTML_ETAG})
+    return HTMLResponse(content=CHAT_HTML, headers={"ETag": CHAT_HTML_ETAG})
+
+async def _ws_sender(websocket: WebSocket, queue: asyncio.Queue):
+    """Send queued responses, merging those already waiting into one frame.
+    
+    A single response is sent as a JSON object; several are sent together
+    as a JSON array.
+    """
+    while True:
+        batch = [await queue.get()]
+        while not queue.empty() and len(batch) < MAX_WS_BATCH:
+            batch.append(queue.get_nowait())
+        await websocket.send_text(ws_encoder.encode(batch[0] if len(batch) == 1 else batch).decode())
+
+def _log_sender_failure(task: asyncio.Task):
+    """Log why a WebSocket sender task stopped, unless it was cancelled."""
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"WebSocket send failed: {str(task.exception())}")
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """Handle WebSocket connections for chat."""
     await websocket.accept()
+    queue: asyncio.Queue = asyncio.Queue()
+    sender = asyncio.create_task(_ws_sender(websocket, queue))
+    sender.add_done_callback(_log_sender_failure)
     
     try:
-        while True:
+        while not sender.done():
             # Receive message from client
             message = await websocket.receive_text()
             
-            # Process message with agent
-            response = await agent.process_query(message)
-            
-            # Send response back to client
-            await websocket.send_json(response)
+            # Process message with agent, forwarding partial output as it arrives.
+            # Stop generating once the sender has stopped and nothing can deliver it.
+            events = agent.stream_query(message)
+            try:
+                async for event in events:
+                    if sender.done():
+                        break
+                    await queue.put(event)
+            finally:
+                await events.aclose()
             
     except WebSocketDisconnect:
         logger.info("WebSocket connection closed")
     except Exception as e:
         logger.error(f"WebSocket error: {str(e)}")
+        sender.cancel()
         try:
-            await websocket.send_json({
-                "success": False,
-                "response": "An error occurred while processing your request."
-            })
+            await websocket.send_text(ws_encoder.encode(ChatResponse(
+                response="An error occurred while processing your request.",
+                success=False,
+                documents_found=False
+            )).decode())
         except:
             pass
+    finally:
+        sender.cancel()
+        await asyncio.gather(sender, return_exceptions=True)
 
 @app.get("/api/recent-documents")
-async def get_recent_docs(limit: Optional[int] = 10):
+async def get_recent_docs(
+    limit: Optional[int] = 10,
+    before_created_at: Optional[datetime] = None,
+    before_id: Optional[str] = None
+):
     """Get the most recently added documents.
     
     Args:
         limit: Maximum number of documents to return (default: 10)
+        before_created_at: `created_at` of the last document on the previous page
+        before_id: `id` of the last document on the previous page
     """
     try:
-        documents = await get_recent_documents(limit)
+        before = (before_created_at, before_id) if before_created_at and before_id else None
+        documents = await get_recent_documents_light(limit, before)
         return {
             "success": True,
             "documents": documents
@@ -84,4 +147,16 @@ async def get_recent_docs(limit: Optional[int] = 10):
         }
 
 if __name__ == "__main__":
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
+    uvicorn.run(
+        "app.main:app",
+        host=settings.APP_HOST,
+        port=settings.APP_PORT,
+        # uvloop has no Windows build; fall back to the stock asyncio loop there
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        ws="websockets",
+        ws_max_queue=settings.WS_MAX_QUEUE,
+        reload=settings.DEBUG,
+        # The chat page is cached in memory, so restart when it changes too
+        reload_includes=["*.html"] if settings.DEBUG else None
+    ) 
\ No newline at end of file
@@ -0,0 +1,15 @@
+import msgspec #type:ignore
+from typing import Union
+
+class ChatResponse(msgspec.Struct):
+    """Final answer to a chat query."""
+    response: str
+    success: bool
+    documents_found: bool
+
+class StreamDelta(msgspec.Struct):
+    """A chunk of the answer, sent while it is still being generated."""
+    delta: str
+
+# Any message the chat WebSocket sends to the client
+WebSocketResponse = Union[ChatResponse, StreamDelta]
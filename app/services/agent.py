@@ -1,9 +1,13 @@
-import json
+import orjson #type:ignore
+import re
 import aiohttp #type:ignore
-from typing import Dict, Any, List
+from async_lru import alru_cache #type:ignore
+from cachetools import TTLCache #type:ignore
+from typing import Dict, AsyncIterator, List, Optional
 import logging
 from ..core.config import get_settings
 from ..core.database import get_db
+from ..models.schemas import ChatResponse, StreamDelta, WebSocketResponse
 
 settings = get_settings()
 logging.basicConfig(level=logging.INFO)
@@ -70,87 +74,142 @@ IMPORTANT:
 
 Remember: Provide specific information from the available documents, formatted clearly and professionally."""
 
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+# Keywords that mark a query as asking for recent documents
+RECENT_QUERY_RE = re.compile(r'\b(?:recent|latest|newest|new)\b', re.IGNORECASE)
+
+SEARCH_DOCUMENTS_QUERY = """
+    SELECT id, title, document_number, document_type, publication_date, abstract 
+    FROM documents 
+    WHERE MATCH(title, abstract, full_text) AGAINST(%s IN NATURAL LANGUAGE MODE)
+    LIMIT %s
+"""
+
+DOCUMENT_DETAILS_QUERY = """
+    SELECT id, title, document_number, document_type, publication_date, 
+           abstract, full_text, agencies 
+    FROM documents 
+    WHERE id = %s
+"""
+
+RECENT_DOCUMENTS_QUERY = """
+    SELECT id, title, document_number, document_type, publication_date, abstract 
+    FROM documents 
+    WHERE publication_date >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
+    ORDER BY publication_date DESC
+    LIMIT 10
+"""
+
 class Agent:
     def __init__(self):
         self.system_prompt = SYSTEM_PROMPT
+        # Static head of every prompt, built once
+        self._prompt_prefix = f"{self.system_prompt}\n\nContext:"
+        self._session: Optional[aiohttp.ClientSession] = None
+        # (normalized query, sorted document ids) -> cleaned LLM response
+        self._response_cache: TTLCache = TTLCache(
+            maxsize=settings.RESPONSE_CACHE_SIZE,
+            ttl=settings.RESPONSE_CACHE_TTL
+        )
+
+    async def startup(self):
+        """Open the HTTP session shared by all Ollama requests."""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=32, keepalive_timeout=60)
+            )
+
+    async def shutdown(self):
+        """Close the shared HTTP session."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
 
     async def search_documents(self, query: str, limit: int = 5) -> List[Dict]:
         """Search for documents in the database."""
         async with get_db() as cur:
-            search_query = """
-                SELECT id, title, document_number, document_type, publication_date, abstract 
-                FROM documents 
-                WHERE MATCH(title, abstract, full_text) AGAINST(%s IN NATURAL LANGUAGE MODE)
-                LIMIT %s
-            """
-            await cur.execute(search_query, (query, limit))
+            await cur.execute(SEARCH_DOCUMENTS_QUERY, (query, limit))
             results = await cur.fetchall()
             return [
                 {
-                    'id': row[0],
-                    'title': row[1],
-                    'document_number': row[2],
-                    'document_type': row[3],
-                    'publication_date': row[4].isoformat() if row[4] else None,
-                    'abstract': row[5]
+                    'id': row['id'],
+                    'title': row['title'],
+                    'document_number': row['document_number'],
+                    'document_type': row['document_type'],
+                    'publication_date': row['publication_date'].isoformat() if row['publication_date'] else None,
+                    'abstract': row['abstract']
                 }
                 for row in results
             ]
 
     async def get_document_details(self, doc_id: str) -> Dict:
-        """Get detailed information about a specific document."""
+        """Get detailed information about a specific document.
+        
+        Found documents are cached per id for five minutes; unknown ids are
+        not cached. Each caller gets its own copy of the cached details.
+        Pipeline runs do not invalidate the cache, so updated documents can
+        be served stale until their entry expires.
+        """
+        try:
+            details = await self._fetch_document_details(doc_id)
+        except LookupError:
+            return None
+        return {**details, 'agencies': list(details['agencies'])}
+
+    @alru_cache(maxsize=1024, ttl=300)
+    async def _fetch_document_details(self, doc_id: str) -> Dict:
+        """Load a document's details, raising LookupError (never cached) if missing."""
         async with get_db() as cur:
-            query = """
-                SELECT id, title, document_number, document_type, publication_date, 
-                       abstract, full_text, agencies 
-                FROM documents 
-                WHERE id = %s
-            """
-            await cur.execute(query, (doc_id,))
+            await cur.execute(DOCUMENT_DETAILS_QUERY, (doc_id,))
             row = await cur.fetchone()
-            if row:
-                return {
-                    'id': row[0],
-                    'title': row[1],
-                    'document_number': row[2],
-                    'document_type': row[3],
-                    'publication_date': row[4].isoformat() if row[4] else None,
-                    'abstract': row[5],
-                    'full_text': row[6],
-                    'agencies': json.loads(row[7]) if row[7] else []
-                }
-            return None
+            if not row:
+                raise LookupError(doc_id)
+            return {
+                'id': row['id'],
+                'title': row['title'],
+                'document_number': row['document_number'],
+                'document_type': row['document_type'],
+                'publication_date': row['publication_date'].isoformat() if row['publication_date'] else None,
+                'abstract': row['abstract'],
+                'full_text': row['full_text'],
+                'agencies': row['agencies'] or []
+            }
 
     async def get_recent_documents(self, days: int = 7) -> List[Dict]:
         """Get recent documents from the last N days."""
         async with get_db() as cur:
-            query = """
-                SELECT id, title, document_number, document_type, publication_date, abstract 
-                FROM documents 
-                WHERE publication_date >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
-                ORDER BY publication_date DESC
-                LIMIT 10
-            """
-            await cur.execute(query, (days,))
+            await cur.execute(RECENT_DOCUMENTS_QUERY, (days,))
             results = await cur.fetchall()
             return [
                 {
-                    'id': row[0],
-                    'title': row[1],
-                    'document_number': row[2],
-                    'document_type': row[3],
-                    'publication_date': row[4].isoformat() if row[4] else None,
-                    'abstract': row[5]
+                    'id': row['id'],
+                    'title': row['title'],
+                    'document_number': row['document_number'],
+                    'document_type': row['document_type'],
+                    'publication_date': row['publication_date'].isoformat() if row['publication_date'] else None,
+                    'abstract': row['abstract']
                 }
                 for row in results
             ]
 
-    async def process_query(self, query: str) -> Dict[str, Any]:
+    async def process_query(self, query: str) -> ChatResponse:
         """Process a user query and return a response."""
+        result = None
+        async for event in self.stream_query(query):
+            if isinstance(event, ChatResponse):
+                result = event
+        return result
+
+    async def stream_query(self, query: str) -> AsyncIterator[WebSocketResponse]:
+        """Process a user query, yielding the answer as Ollama generates it.
+        
+        Yields a `StreamDelta` for each chunk of the answer, then a final
+        `ChatResponse`.
+        """
         try:
             # Check if this is a query about recent documents
-            recent_queries = ["recent", "latest", "most recent", "new", "newest"]
-            is_recent_query = any(term in query.lower() for term in recent_queries)
+            is_recent_query = bool(RECENT_QUERY_RE.search(query))
             
             if is_recent_query:
                 # Use get_recent_documents for recent document queries
@@ -165,66 +224,130 @@ class Agent:
             for doc in documents:
                 logger.info(f"Document: {doc['title']} ({doc['document_number']}) - {doc['publication_date']}")
             
-            doc_context = ""
+            parts: List[str] = []
             if documents:
-                doc_context = "\nAvailable documents:\n"
+                parts.append("\nAvailable documents:\n")
                 # Sort documents by publication date for recent queries
                 if is_recent_query:
                     documents = sorted(documents, key=lambda x: x['publication_date'] if x['publication_date'] else "", reverse=True)
                 
                 for doc in documents:
                     # Ensure all text is properly encoded as ASCII/English
-                    doc_context += f"\nDocument ID: {doc['id']}\n"
-                    doc_context += f"Title: {self._clean_text(doc['title'])}\n"
-                    doc_context += f"Document Number: {doc['document_number']}\n"
-                    doc_context += f"Type: {doc['document_type']}\n"
-                    doc_context += f"Publication Date: {doc['publication_date']}\n"
-                    doc_context += f"Abstract: {self._clean_text(doc['abstract'])}\n"
+                    parts.append(
+                        f"\nDocument ID: {doc['id']}\n"
+                        f"Title: {self._clean_text(doc['title'])}\n"
+                        f"Document Number: {doc['document_number']}\n"
+                        f"Type: {doc['document_type']}\n"
+                        f"Publication Date: {doc['publication_date']}\n"
+                        f"Abstract: {self._clean_text(doc['abstract'])}\n"
+                    )
             else:
                 if is_recent_query:
-                    doc_context = "\nNo recent documents found in the database.\n"
+                    parts.append("\nNo recent documents found in the database.\n")
                 else:
-                    doc_context = "\nNo documents found matching the query.\n"
+                    parts.append("\nNo documents found matching the query.\n")
                 logger.warning("No documents found in results")
 
             # Add specific instruction for recent document queries
             if is_recent_query:
-                doc_context += "\nInstructions: Please list the documents in chronological order, starting with the most recent. Include the publication date for each document.\n"
+                parts.append("\nInstructions: Please list the documents in chronological order, starting with the most recent. Include the publication date for each document.\n")
+
+            doc_context = "".join(parts)
+
+            # Reuse the answer to an identical question over the same documents.
+            # Recent-document answers are time-sensitive and never cached.
+            cache_key = None
+            if not is_recent_query:
+                cache_key = (" ".join(query.lower().split()), tuple(sorted(doc['id'] for doc in documents)))
+                cached_response = self._response_cache.get(cache_key)
+                if cached_response is not None:
+                    logger.info("Serving response from cache")
+                    yield ChatResponse(
+                        response=cached_response,
+                        success=True,
+                        documents_found=len(documents) > 0
+                    )
+                    return
 
             # Call Ollama API with document context
-            async with aiohttp.ClientSession() as session:
-                payload = {
-                    "model": settings.MODEL_NAME,
-                    "prompt": f"{self.system_prompt}\n\nContext:{doc_context}\n\nUser: {query}\nAssistant:",
-                    "stream": False
-                }
-                
-                async with session.post(settings.OLLAMA_API_URL, json=payload) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        cleaned_response = self._clean_text(result.get('response', ''))
-                        return {
-                            'response': cleaned_response,
-                            'success': True,
-                            'documents_found': len(documents) > 0
-                        }
-                    else:
-                        error_msg = f"Ollama API error: {response.status}"
+            if self._session is None or self._session.closed:
+                await self.startup()
+            payload = {
+                "model": settings.MODEL_NAME,
+                "prompt": "".join((self._prompt_prefix, doc_context, "\n\nUser: ", query, "\nAssistant:")),
+                "stream": True
+            }
+            
+            async with self._session.post(
+                settings.OLLAMA_API_URL,
+                data=orjson.dumps(payload),
+                headers=JSON_HEADERS
+            ) as response:
+                if response.status != 200:
+                    error_msg = f"Ollama API error: {response.status}"
+                    logger.error(error_msg)
+                    yield ChatResponse(
+                        response=error_msg,
+                        success=False,
+                        documents_found=len(documents) > 0
+                    )
+                    return
+
+                # Ollama streams one JSON object per line until "done" is set;
+                # failures after the headers are sent arrive as an "error" line
+                chunks: List[str] = []
+                done = False
+                async for line in response.content:
+                    if not line.strip():
+                        continue
+                    data = orjson.loads(line)
+                    if data.get('error'):
+                        error_msg = f"Ollama API error: {data['error']}"
                         logger.error(error_msg)
-                        return {
-                            'response': error_msg,
-                            'success': False,
-                            'documents_found': len(documents) > 0
-                        }
-                        
+                        yield ChatResponse(
+                            response=error_msg,
+                            success=False,
+                            documents_found=len(documents) > 0
+                        )
+                        return
+                    text = data.get('response', '')
+                    if text:
+                        chunks.append(text)
+                        # Filter like _clean_text, but keep the whitespace between chunks
+                        delta = text.encode('ascii', 'ignore').decode('ascii')
+                        if delta:
+                            yield StreamDelta(delta=delta)
+                    if data.get('done'):
+                        done = True
+                        break
+
+                if not done:
+                    error_msg = "Ollama API error: response stream ended before completion"
+                    logger.error(error_msg)
+                    yield ChatResponse(
+                        response=error_msg,
+                        success=False,
+                        documents_found=len(documents) > 0
+                    )
+                    return
+
+                cleaned_response = self._clean_text("".join(chunks))
+                if cache_key is not None:
+                    self._response_cache[cache_key] = cleaned_response
+                yield ChatResponse(
+                    response=cleaned_response,
+                    success=True,
+                    documents_found=len(documents) > 0
+                )
+                    
         except Exception as e:
             error_msg = f"Error processing query: {str(e)}"
             logger.error(error_msg)
-            return {
-                'response': error_msg,
-                'success': False,
-                'documents_found': False
-            }
+            yield ChatResponse(
+                response=error_msg,
+                success=False,
+                documents_found=False
+            )
 
     def _clean_text(self, text: str) -> str:
         """Clean text to ensure only standard English characters are used."""
@@ -232,5 +355,5 @@ class Agent:
             return ""
                     
         # Remove any non-ASCII characters
-        cleaned = ''.join(char for char in text if ord(char) < 128)
+        cleaned = text.encode('ascii', 'ignore').decode('ascii')
         return cleaned.strip()
\ No newline at end of file
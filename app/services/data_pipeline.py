@@ -1,107 +1,163 @@
 import aiohttp #type:ignore
 import asyncio
-import json
+import orjson #type:ignore
 from datetime import datetime, timedelta
 import logging
 from ..core.config import get_settings
-from ..core.database import init_db, get_db
+from ..core.database import init_db, close_db_connection, get_db
 import dateutil.parser  
 
 settings = get_settings()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Regulations.gov serves at most 20 pages of 250 documents per query
+MAX_PAGES = 20
+# Concurrent page requests in flight against the API
+PAGE_FETCH_CONCURRENCY = 8
+
+async def _fetch_page(session: aiohttp.ClientSession, params: dict, page: int, sem: asyncio.Semaphore):
+    """Fetch a single page of documents, or None if the request failed."""
+    async with sem:
+        async with session.get(
+            f"{settings.REGULATIONS_API_URL}/v4/documents",
+            params={**params, 'page[number]': page}
+        ) as response:
+            if response.status == 200:
+                return await response.json(loads=orjson.loads)
+            logger.error(f"Failed to fetch page {page}: {response.status}")
+            return None
+
 async def fetch_regulations_data(start_date: str, end_date: str) -> list:
-    """Fetch data from Regulations.gov API for the given date range."""
-    async with aiohttp.ClientSession() as session:
-        params = {
-            'filter[postedDate][ge]': start_date,
-            'filter[postedDate][le]': end_date,
-            'sort': '-postedDate',
-            'page[size]': 250,
-            'api_key': settings.REGULATIONS_API_KEY
-        }
-        
+    """Fetch data from Regulations.gov API for the given date range.
+    
+    The first page is fetched alone to learn the page count from its `meta`;
+    the remaining pages are then fetched concurrently.
+    """
+    params = {
+        'filter[postedDate][ge]': start_date,
+        'filter[postedDate][le]': end_date,
+        'sort': '-postedDate',
+        'page[size]': 250,
+        'api_key': settings.REGULATIONS_API_KEY
+    }
+    sem = asyncio.Semaphore(PAGE_FETCH_CONCURRENCY)
+    connector = aiohttp.TCPConnector(limit=16)
+    
+    async with aiohttp.ClientSession(connector=connector) as session:
         try:
-            documents = []
-            page = 1
-            while True:
-                params['page[number]'] = page
-                async with session.get(f"{settings.REGULATIONS_API_URL}/v4/documents", params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        if not data.get('data'):
-                            break
-                        documents.extend(data['data'])
-                        page += 1
-                        if page > 20:  # Limit to 5000 documents per fetch (20 pages * 250 per page)
-                            break
-                    else:
-                        logger.error(f"Failed to fetch data: {response.status}")
-                        break
+            first = await _fetch_page(session, params, 1, sem)
+            if not first or not first.get('data'):
+                return []
+            documents = list(first['data'])
+            
+            total_pages = min(first.get('meta', {}).get('totalPages', 1), MAX_PAGES)
+            results = await asyncio.gather(
+                *(_fetch_page(session, params, page, sem) for page in range(2, total_pages + 1)),
+                return_exceptions=True
+            )
+            for page, result in enumerate(results, start=2):
+                if isinstance(result, Exception):
+                    logger.error(f"Error fetching page {page}: {str(result)}")
+                elif result:
+                    documents.extend(result.get('data', []))
             return documents
         except Exception as e:
             logger.error(f"Error fetching data: {str(e)}")
             return []
 
+def parse_posted_date(posted_date: str) -> datetime:
+    """Parse a Regulations.gov `postedDate` value.
+    
+    The API sends ISO-8601 UTC timestamps such as "2024-03-15T04:00:00Z",
+    which `datetime.fromisoformat` handles directly; anything else falls back
+    to dateutil, which also raises TypeError for non-string values. The
+    trailing "Z" is dropped (older Pythons reject it); the DATETIME column
+    stores no offset either way.
+    """
+    if isinstance(posted_date, str):
+        try:
+            return datetime.fromisoformat(posted_date.rstrip('Z'))
+        except ValueError:
+            pass
+    return dateutil.parser.parse(posted_date)
+
+# Insert or update document
+UPSERT_DOCUMENT_QUERY = """
+    INSERT INTO documents 
+    (id, title, document_number, document_type, publication_date, 
+     abstract, full_text, agencies) 
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+    title=VALUES(title),
+    document_number=VALUES(document_number),
+    document_type=VALUES(document_type),
+    publication_date=VALUES(publication_date),
+    abstract=VALUES(abstract),
+    full_text=VALUES(full_text),
+    agencies=VALUES(agencies)
+"""
+
+# Rows sent per multi-row INSERT; bounds packet size and client memory
+INSERT_BATCH_SIZE = 500
+
 async def process_and_store_documents(documents: list):
     """Process and store documents in the database."""
-    async with get_db() as cur:
-        for doc in documents:
-            try:
-                # Extract relevant fields from the document attributes
-                attributes = doc.get('attributes', {})
-                
-                # Parse the publication date
-                posted_date = attributes.get('postedDate')
-                if posted_date:
-                    try:
-                        publication_date = dateutil.parser.parse(posted_date)
-                    except (ValueError, TypeError):
-                        logger.warning(f"Invalid date format for document {doc.get('id')}: {posted_date}")
-                        publication_date = None
-                else:
+    rows = []
+    for doc in documents:
+        try:
+            # Extract relevant fields from the document attributes
+            attributes = doc.get('attributes', {})
+            
+            # Parse the publication date
+            posted_date = attributes.get('postedDate')
+            if posted_date:
+                try:
+                    publication_date = parse_posted_date(posted_date)
+                except (ValueError, TypeError, OverflowError):
+                    logger.warning(f"Invalid date format for document {doc.get('id')}: {posted_date}")
                     publication_date = None
-                
-                doc_data = {
-                    'id': doc.get('id'),
-                    'title': attributes.get('title'),
-                    'document_number': attributes.get('documentNumber'),
-                    'document_type': attributes.get('documentType'),
-                    'publication_date': publication_date,
-                    'abstract': attributes.get('abstract'),
-                    'full_text': attributes.get('fileText'),
-                    'agencies': json.dumps([agency.get('name') for agency in attributes.get('agencies', [])])
-                }
-                
-                # Skip if document ID is None
-                if not doc_data['id']:
-                    continue
-                
-                # Insert or update document
-                query = """
-                    INSERT INTO documents 
-                    (id, title, document_number, document_type, publication_date, 
-                     abstract, full_text, agencies) 
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    ON DUPLICATE KEY UPDATE
-                    title=VALUES(title),
-                    document_number=VALUES(document_number),
-                    document_type=VALUES(document_type),
-                    publication_date=VALUES(publication_date),
-                    abstract=VALUES(abstract),
-                    full_text=VALUES(full_text),
-                    agencies=VALUES(agencies)
-                """
-                
-                await cur.execute(query, (
-                    doc_data['id'], doc_data['title'], doc_data['document_number'],
-                    doc_data['document_type'], doc_data['publication_date'],
-                    doc_data['abstract'], doc_data['full_text'], doc_data['agencies']
-                ))
-                
-            except Exception as e:
-                logger.error(f"Error processing document {doc.get('id')}: {str(e)}")
+            else:
+                publication_date = None
+            
+            doc_data = {
+                'id': doc.get('id'),
+                'title': attributes.get('title'),
+                'document_number': attributes.get('documentNumber'),
+                'document_type': attributes.get('documentType'),
+                'publication_date': publication_date,
+                'abstract': attributes.get('abstract'),
+                'full_text': attributes.get('fileText'),
+                'agencies': orjson.dumps([agency.get('name') for agency in attributes.get('agencies', [])]).decode()
+            }
+            
+            # Skip if document ID is None
+            if not doc_data['id']:
+                continue
+            
+            rows.append((
+                doc_data['id'], doc_data['title'], doc_data['document_number'],
+                doc_data['document_type'], doc_data['publication_date'],
+                doc_data['abstract'], doc_data['full_text'], doc_data['agencies']
+            ))
+            
+        except Exception as e:
+            logger.error(f"Error processing document {doc.get('id')}: {str(e)}")
+
+    if not rows:
+        return
+
+    # Write all rows in one transaction, a chunk of multi-row INSERTs at a time
+    async with get_db() as cur:
+        conn = cur.connection
+        await conn.begin()
+        try:
+            for i in range(0, len(rows), INSERT_BATCH_SIZE):
+                await cur.executemany(UPSERT_DOCUMENT_QUERY, rows[i:i + INSERT_BATCH_SIZE])
+            await conn.commit()
+        except Exception:
+            await conn.rollback()
+            raise
 
 async def run_pipeline(days: int = 7):
     """Run the data pipeline to fetch and store Regulations.gov data.
@@ -131,5 +187,12 @@ async def run_pipeline(days: int = 7):
     except Exception as e:
         logger.error(f"Pipeline error: {str(e)}")
 
+async def _run_standalone(days: int):
+    """Run the pipeline as a script, then release the shared connection pool."""
+    try:
+        await run_pipeline(days)
+    finally:
+        await close_db_connection()
+
 if __name__ == "__main__":
-    asyncio.run(run_pipeline(120)) 
\ No newline at end of file
+    asyncio.run(_run_standalone(120)) 
\ No newline at end of file